@@ -1,3 +1,11 @@
+import functools
+import itertools
+import math
+import multiprocessing
+import os
+from collections import deque
+import numpy as np
+import pickle
 import random
 
 #Manually adjust these parameters to set the deck type and an initial guess for where to start searching
@@ -14,76 +22,165 @@ initial_5_cmc = 9
 initial_6_cmc = 0
 initial_land = 38
 initial_draw = 0
-debug_mode = False
+#Cost is 3 for Divination, 4 for Harmonize; draw is 2 for Divination, 3 for Harmonize
+draw_cost = 4
+draw_draw = 3
+#Stop early once the best estimate stops improving across iterations; disable to always search until the sims_for_best_deck target
+plateau_early_stopping = True
+#Explore with simulated annealing (one random neighbor per step, Metropolis acceptance) instead of full neighborhood sweeps
+#Much cheaper per step and able to escape shallow local optima, but the default full sweep gives tighter comparisons near the end
+simulated_annealing = False
+#Guarding debug prints with __debug__ lets python -O strip these branches (and their f-strings) from the bytecode entirely
+DEBUG = False
+
+#Hands, libraries, and decklists are plain int lists indexed by card type, which turns every string hash + dict probe
+#in the simulation into an array load
+#The 1-6 CMC spells sit at index cmc - 1; the named types follow
+CARD_TYPES = ('1 CMC', '2 CMC', '3 CMC', '4 CMC', '5 CMC', '6 CMC', 'Rock', 'Sol Ring', 'Draw', 'Land')
+EMPTY_HAND = (0,) * len(CARD_TYPES)
+ROCK = 6
+SOL_RING = 7
+DRAW = 8
+LAND = 9
+
+#Mana weight of each drop (indexed by cmc - 1) when tallying mana spent; six drops are very powerful and count as 6.2 mana each
+cmc_weight = (1, 2, 3, 4, 5, 6.2)
 
 def put_spells_on_bottom(hand, spells_remaining_to_bottom):
 	"""	
 	Parameters:
-		hand - A dictionary, with the same cardnames as in decklist, with number drawn
+		hand - A list of counts per card type, indexed like CARD_TYPES
 		spells_remaining_to_bottom - The number of spells to bottom after a mulligan (must be <= number of spells in hand)
 	Returns - nothing, it just adjusts the opening hand value by bottoming excess rocks and the most expensive spells after a mull
 	"""
 	#If the hand has too much mana, the first card(s) to bottom are all but one Rock
-	if (hand['Rock'] >= 3) or (hand['Land'] >= 3 and hand['Rock'] >= 2):
-		Bottomable_rock = min(hand['Rock'] - 1, spells_remaining_to_bottom)
-		hand['Rock'] -= Bottomable_rock
+	if (hand[ROCK] >= 3) or (hand[LAND] >= 3 and hand[ROCK] >= 2):
+		Bottomable_rock = min(hand[ROCK] - 1, spells_remaining_to_bottom)
+		hand[ROCK] -= Bottomable_rock
 		spells_remaining_to_bottom -= Bottomable_rock
 
-	Bottomable_cmc_6 = min(hand['6 CMC'], spells_remaining_to_bottom)
-	hand['6 CMC'] -= Bottomable_cmc_6
-	spells_remaining_to_bottom -= Bottomable_cmc_6
-
-	Bottomable_cmc_5 = min(hand['5 CMC'], spells_remaining_to_bottom)
-	hand['5 CMC'] -= Bottomable_cmc_5
-	spells_remaining_to_bottom -= Bottomable_cmc_5
-
-	Bottomable_cmc_4 = min(hand['4 CMC'], spells_remaining_to_bottom)
-	hand['4 CMC'] -= Bottomable_cmc_4
-	spells_remaining_to_bottom -= Bottomable_cmc_4
-
-	Bottomable_cmc_3 = min(hand['3 CMC'], spells_remaining_to_bottom)
-	hand['3 CMC'] -= Bottomable_cmc_3
-	spells_remaining_to_bottom -= Bottomable_cmc_3
-
-	Bottomable_cmc_2 = min(hand['2 CMC'], spells_remaining_to_bottom)
-	hand['2 CMC'] -= Bottomable_cmc_2
-	spells_remaining_to_bottom -= Bottomable_cmc_2
-
-	Bottomable_cmc_1 = min(hand['1 CMC'], spells_remaining_to_bottom)
-	hand['1 CMC'] -= Bottomable_cmc_1
-	spells_remaining_to_bottom -= Bottomable_cmc_1
+	#Bottom the most expensive spells first
+	for cmc in range(6, 0, -1):
+		Bottomable = min(hand[cmc - 1], spells_remaining_to_bottom)
+		hand[cmc - 1] -= Bottomable
+		spells_remaining_to_bottom -= Bottomable
 
 	#Card advantage becomes more important after a mulligan, so bottom that last
-	Bottomable_draw = min(hand['Draw'], spells_remaining_to_bottom)
-	hand['Draw'] -= Bottomable_draw
+	Bottomable_draw = min(hand[DRAW], spells_remaining_to_bottom)
+	hand[DRAW] -= Bottomable_draw
 	spells_remaining_to_bottom -= Bottomable_draw
 	
 	#In case of unusual all land and all rock hands, bottom the remainder
-	Bottomable_rock = min(hand['Rock'], spells_remaining_to_bottom)
-	hand['Rock'] -= Bottomable_rock
+	Bottomable_rock = min(hand[ROCK], spells_remaining_to_bottom)
+	hand[ROCK] -= Bottomable_rock
 	spells_remaining_to_bottom -= Bottomable_rock
 
 
 def nr_spells(hand):
-	return hand['1 CMC'] + hand['2 CMC'] + hand['3 CMC'] + hand['4 CMC'] + hand['5 CMC'] + hand['6 CMC'] + hand['Rock'] + hand['Draw']
+	return hand[0] + hand[1] + hand[2] + hand[3] + hand[4] + hand[5] + hand[ROCK] + hand[DRAW]
 
 def nr_mana(hand):
-	return hand['Land'] + hand['Rock']
+	return hand[LAND] + hand[ROCK]
+
+def pack_deck_key(one, two, three, four, five, six, rock, draw, land):
+	"""
+	Pack the nine card counts (each fits in 7 bits) into a single int
+	Hashing one int is much cheaper than hashing a 9-tuple, and these keys are looked up many times per candidate deck
+	"""
+	return one | two << 7 | three << 14 | four << 21 | five << 28 | six << 35 | rock << 42 | draw << 49 | land << 56
+
+def unpack_deck_key(deck_key):
+	return tuple((deck_key >> shift) & 127 for shift in range(0, 63, 7))
+
+@functools.lru_cache(maxsize=256)
+def nearby_decks(best_deck, wide_neighborhood):
+	"""
+	Parameters:
+		best_deck - Tuple of (one, two, three, four, five, six, rock, draw, land) at the center of the neighborhood
+		wide_neighborhood - If False, candidates may differ from best_deck by at most two single-card swaps; if True, by one copy per card type
+	Returns - A tuple of (candidate, deck_key, decklist) triples: each candidate a 9-tuple of card counts summing
+		to deck_size - 1, deck_key its packed form, and decklist the CARD_TYPES-ordered tuple handed to the sim workers,
+		so callers looping over the neighborhood don't re-pack or rebuild either one every iteration
+	The neighborhood is a pure function of its arguments and the search re-centers on the same deck for many
+	iterations in a row, so the enumeration is cached
+	"""
+	(best_one, best_two, best_three, best_four, best_five, best_six, best_rock, best_draw, best_land) = best_deck
+	candidates = []
+	#The land bounds never change inside the loops, and each loop level carries its running change count down
+	#so inner levels don't recompute the absolute differences of all the outer levels
+	land_low = max(best_land - 1, 0)
+	land_high = best_land + 1
+	for one in range(max(best_one - 1, 0), best_one + 2):
+		changes_one = abs(one - best_one)
+		for two in range(max(best_two - 1, 0), best_two + 2):
+			changes_two = changes_one + abs(two - best_two)
+			#In the narrow phase, abandon any branch already past the change budget; each deeper level only adds to it
+			if changes_two > 2 and not wide_neighborhood:
+				continue
+			for three in range(max(best_three - 1, 0), best_three + 2):
+				changes_three = changes_two + abs(three - best_three)
+				if changes_three > 2 and not wide_neighborhood:
+					continue
+				for four in range(max(best_four - 1, 0), best_four + 2):
+					changes_four = changes_three + abs(four - best_four)
+					if changes_four > 2 and not wide_neighborhood:
+						continue
+					for five in range(max(best_five - 1, 0), best_five + 2):
+						changes_five = changes_four + abs(five - best_five)
+						if changes_five > 2 and not wide_neighborhood:
+							continue
+						for six in range(max(best_six - 1, 0), best_six + 2):
+							changes_six = changes_five + abs(six - best_six)
+							if changes_six > 2 and not wide_neighborhood:
+								continue
+							for rock in range(max(best_rock - 1, 0), best_rock + 2):
+								changes_rock = changes_six + abs(rock - best_rock)
+								if changes_rock > 2 and not wide_neighborhood:
+									continue
+								for draw in [0]: #This could vary initially, but was later fixed at 0 to greatly reduce optimization time
+									#The deck size constraint pins the number of lands, so compute it directly rather than looping over and rejecting candidates
+									#Note deck_size - 1 because Sol Ring is always part of the deck
+									land = deck_size - 1 - (one + two + three + four + five + six + rock + draw)
+									if land < land_low or land > land_high:
+										continue
+									#In the wide phase every candidate that fits the land bounds is in; skip the distance tally entirely
+									if wide_neighborhood or changes_rock + abs(land - best_land) <= 2:
+										candidates.append(((one, two, three, four, five, six, rock, draw, land), pack_deck_key(one, two, three, four, five, six, rock, draw, land), (one, two, three, four, five, six, rock, 1, draw, land)))
+	return tuple(candidates)
+
+@functools.lru_cache(maxsize=512)
+def build_library(decklist):
+	"""Build the library for a decklist as a flat tuple of card type indices
+	Cached per distinct decklist, so a worker evaluating the same deck across many batches builds it once;
+	the result is immutable and callers copy it into a working list"""
+	library = []
+	for card_type in range(len(CARD_TYPES)):
+		#extend from a repeat iterator fills the list directly, without materializing a temporary per card type
+		library.extend(itertools.repeat(card_type, decklist[card_type]))
+	return tuple(library)
+
+def shuffle_and_take_mulligans(decklist, rng=random, library_template=None):
+	"""
+	Parameters:
+		decklist - A list of counts per card type, indexed like CARD_TYPES
+		rng - Source of randomness; defaults to the module-level generator
+		library_template - Optional prebuilt library for this decklist; callers running many sims of the
+			same deck build it once and every sim starts from a cheap copy instead of a fresh build
+	Returns - (hand, library, cards_left) after all mulligan decisions
+		hand holds the counts of cards we kept; the first cards_left entries of library are the cards not yet drawn
+	"""
+	#Rather than shuffling all ~92 cards up front, we draw with an incremental Fisher-Yates below
+	#That way we only pay for the random work of the ~14 cards actually seen (opening hand plus turn draws)
+	if library_template is None:
+		library_template = build_library(decklist)
+	library = list(library_template)
+	#One hand list is reused across mulligan attempts; each attempt resets it in place instead of allocating a new one
+	hand = [0] * len(CARD_TYPES)
+	#The draw loop runs up to 35 times per sim; binding the method once skips the attribute lookup each draw
+	randrange = rng.randrange
 
-def run_one_sim():	
-	#Initialize variables
-	lands_in_play = 0
-	rocks_in_play = 0
-	compounded_mana_spent = 0
-	cumulative_mana_in_play = 0
-	turn_of_interest = 7
-	mana_available = 0
-	draw_cost = 4 #Cost is 3 for Divination, 4 for Harmonize
-	draw_draw = 3 #Draw is 2 for Divination, 3 for Harmonize
-		
-	#Draw opening hands and mulligan
 	keephand = False 
-	if debug_mode:
+	if __debug__ and DEBUG:
 		print("----------")
 
 	for handsize in [(7, 'free'), 7, 6, 5, 4]:
@@ -91,96 +188,104 @@ def run_one_sim():
 		#Once we actually keep, the variable keephand will be set to True
 		if not keephand:
 			
-			#Construct library as a list, then shuffle
-			library = []
-			for card in decklist.keys():
-				library += [card] * decklist[card]
-			random.shuffle(library)
+			#Putting the previous hand "back" is just resetting the undrawn count; the list always holds the same cards
+			cards_left = len(library)
 
 			#Construct a random opening hand
-			hand = {
-				'1 CMC': 0,
-				'2 CMC': 0,
-				'3 CMC': 0,
-				'4 CMC': 0,
-				'5 CMC': 0,
-				'6 CMC': 0,
-				'Rock': 0,
-				'Sol Ring': 0,
-				'Draw': 0,
-				'Land': 0
-			}
+			hand[:] = EMPTY_HAND
 
 			for _ in range(7):
-				card_drawn = library.pop(0)
-				hand[card_drawn] += 1
+				#Draw a uniformly random undrawn card by swapping it to the end of the undrawn region
+				position = randrange(cards_left)
+				cards_left -= 1
+				library[position], library[cards_left] = library[cards_left], library[position]
+				hand[library[cards_left]] += 1
 
-			if debug_mode:
+			if __debug__ and DEBUG:
 				print("Opening hand:", hand)
 
+			#Tally these once per drawn hand; every keep/bottom decision below reads the pre-bottoming counts
+			spells_in_hand = nr_spells(hand)
+			mana_in_hand = nr_mana(hand)
+
 			#Check to see if we keep				
 			if handsize == (7, 'free'):
-				if (hand['Land'] >= 3 and hand['Land'] <= 5 and nr_mana(hand) <= 5) or (hand['Land'] >= 1 and hand['Land'] <= 5 and hand['Sol Ring'] == 1):
+				if (hand[LAND] >= 3 and hand[LAND] <= 5 and mana_in_hand <= 5) or (hand[LAND] >= 1 and hand[LAND] <= 5 and hand[SOL_RING] == 1):
 					keephand = True
 				
 			if handsize == 7:
-				if (hand['Land'] >= 2 and hand['Land'] <= 5 and nr_mana(hand) <= 5) or (hand['Land'] >= 1 and hand['Land'] <= 5 and hand['Sol Ring'] == 1):
+				if (hand[LAND] >= 2 and hand[LAND] <= 5 and mana_in_hand <= 5) or (hand[LAND] >= 1 and hand[LAND] <= 5 and hand[SOL_RING] == 1):
 					keephand = True
 
 			if handsize == 6:
 				#We have to bottom. Ideal would be 3 land, 2 spells, 1 rock
-				if nr_spells(hand) > 3:
+				if spells_in_hand > 3:
 					put_spells_on_bottom(hand, 1)
 				else:
 					#The hand has 0, 1, 2, or 3 spells so we put a land on the bottom
-					hand['Land'] -= 1
+					hand[LAND] -= 1
 				#Do we keep?
-				if (hand['Land'] >= 2 and hand['Land'] <= 4) or (hand['Land'] >= 1 and hand['Sol Ring'] == 1):
+				if (hand[LAND] >= 2 and hand[LAND] <= 4) or (hand[LAND] >= 1 and hand[SOL_RING] == 1):
 					keephand = True
 
 			if handsize == 5:
 				#We have to bottom. Ideal would be 3 land, 1 spell, 1 rock
-				if nr_spells(hand) > 3:
+				if spells_in_hand > 3:
 					#Two spells on the bottom
 					put_spells_on_bottom(hand, 2)
-				elif nr_spells(hand) == 3:
+				elif spells_in_hand == 3:
 					#One land, one spell on the bottom
-					hand['Land'] -= 1
+					hand[LAND] -= 1
 					put_spells_on_bottom(hand, 1)
 				else:
 					#The hand has 0, 1, or 2 spells so we put two land on the bottom
-					hand['Land'] -= 2
+					hand[LAND] -= 2
 				#Do we keep?
-				if (hand['Land'] >= 2 and hand['Land'] <= 4) or (hand['Land'] >= 1 and hand['Sol Ring'] == 1):
+				if (hand[LAND] >= 2 and hand[LAND] <= 4) or (hand[LAND] >= 1 and hand[SOL_RING] == 1):
 					keephand = True
 
 			if handsize == 4:
 				#We have to bottom. Ideal would be 3 land, 1 rock
-				if nr_spells(hand) > 3:
+				if spells_in_hand > 3:
 					#Three spells on the bottom
 					put_spells_on_bottom(hand, 3)
-				elif nr_spells(hand) == 3:
+				elif spells_in_hand == 3:
 					#One land, two spell on the bottom
-					hand['Land'] -= 1
+					hand[LAND] -= 1
 					put_spells_on_bottom(hand, 2)
-				elif nr_spells(hand) == 2:
+				elif spells_in_hand == 2:
 					#Two land, one spell on the bottom
-					hand['Land'] -= 2
+					hand[LAND] -= 2
 					put_spells_on_bottom(hand, 1)
 				else:
 					#The hand has 0 or 1 spell so we put three land on the bottom
-					hand['Land'] -= 3
+					hand[LAND] -= 3
 				#Do we keep?
 				keephand = True
 
-			if debug_mode:
+			if __debug__ and DEBUG:
 				print("After bottoming:", hand)
 				print("Keephand:", keephand)
-	
-	#Add commander as a free spell
-	hand[f'{commander_cost} CMC'] += 1
-	if debug_mode:
+
+	return (hand, library, cards_left)
+
+
+def run_one_sim(decklist, rng=random, library_template=None):
+	#Initialize variables
+	lands_in_play = 0
+	rocks_in_play = 0
+	compounded_mana_spent = 0
+	cumulative_mana_in_play = 0
+	turn_of_interest = 7
+	mana_available = 0
+
+	#Draw opening hands and mulligan; the library is only built and drawn once
+	(hand, library, cards_left) = shuffle_and_take_mulligans(decklist, rng, library_template)
+	#Add the commander to the kept hand as a free spell; it is cast from the command zone and never sits in the library
+	hand[commander_cost - 1] += 1
+	if __debug__ and DEBUG:
 		print("After adding commander:", hand)
+	randrange = rng.randrange
 
 	for turn in range(1, turn_of_interest + 1):
 		#For turn_of_interest = 7, this range is {1, 2, ..., 7} so we consider mana spent over the first 7 turns
@@ -192,13 +297,16 @@ def run_one_sim():
 		compounded_mana_spent += cumulative_mana_in_play
 		
 		#In Commander, you always draw a card, even when playing first
-		card_drawn = library.pop(0)
+		position = randrange(cards_left)
+		cards_left -= 1
+		library[position], library[cards_left] = library[cards_left], library[position]
+		card_drawn = library[cards_left]
 		hand[card_drawn] += 1
 		
 		#Play a land if possible
 		land_played = False
-		if (hand['Land'] > 0):
-			hand['Land'] -= 1
+		if (hand[LAND] > 0):
+			hand[LAND] -= 1
 			lands_in_play += 1
 			land_played = True
 		
@@ -206,32 +314,33 @@ def run_one_sim():
 		mana_available_at_start_turn = mana_available
 		we_cast_a_nonrock_spell_this_turn = False
 		
-		if debug_mode:
+		if __debug__ and DEBUG:
 			print(f"TURN {turn}. Card drawn {card_drawn}. {lands_in_play} lands, {rocks_in_play} rocks. Mana available {mana_available}. Cumulative mana {compounded_mana_spent}. Hand:", hand)
 		
-		if (turn == 1):
-			lucky = 1 if hand['Sol Ring'] == 1 else 0
-			if (mana_available >= 1) and hand['Sol Ring'] == 1:
-				hand['Sol Ring'] -= 1
+		#The turn-one and later-turn Sol Ring cases are mutually exclusive, so only one branch is ever tested per turn
+		if turn == 1:
+			#The deck runs exactly one Sol Ring, so the hand count is already the 0/1 lucky indicator
+			lucky = hand[SOL_RING]
+			if (mana_available >= 1) and hand[SOL_RING] == 1:
+				hand[SOL_RING] -= 1
 				#Sol Ring counts as 2 mana rocks
 				rocks_in_play += 2
 				#Also cast Signet if possible
-				if hand['Rock'] >= 1:
-					hand['Rock'] -= 1
+				if hand[ROCK] >= 1:
+					hand[ROCK] -= 1
 					rocks_in_play += 1
 				mana_available = 0
 				#We can't do anything else after a turn one Sol Ring
-		
-		if turn >= 2:
-			if (mana_available >= 1) and hand['Sol Ring'] == 1:
-				hand['Sol Ring'] -= 1
+		else:
+			if (mana_available >= 1) and hand[SOL_RING] == 1:
+				hand[SOL_RING] -= 1
 				#Costs one mana, immediately adds two. Card is utterly broken
 				mana_available += 1
 				rocks_in_play += 2
 			
-		if (turn == 2):
-			Castable_rock = min(hand['Rock'], mana_available // 2)
-			hand['Rock'] -= Castable_rock
+		if turn == 2:
+			Castable_rock = min(hand[ROCK], mana_available // 2)
+			hand[ROCK] -= Castable_rock
 			#Rocks cost 2 each, then tap for 1 each
 			mana_available -= Castable_rock * 2
 			mana_available += Castable_rock
@@ -239,257 +348,504 @@ def run_one_sim():
 			#Rocks DO NOT count as mana spent or mana in play. Mana in play represents creatures, planeswalkers, etc. Rocks are like lands
 		
 		#On turn 3 or 4, cast a mana rock and a (mana available - 1) drop if possible
-		if turn in [3, 4] and mana_available >= 2 and mana_available <= 7:
+		if 3 <= turn <= 4 and 2 <= mana_available <= 7:
 			cmc_of_followup_spell = mana_available - 1
-			if hand['Rock'] >= 1 and hand[f'{cmc_of_followup_spell} CMC'] >= 1:
-				hand['Rock'] -= 1
+			if hand[ROCK] >= 1 and hand[cmc_of_followup_spell - 1] >= 1:
+				hand[ROCK] -= 1
 				mana_available -= 1
 				rocks_in_play += 1
-				hand[f'{cmc_of_followup_spell} CMC'] -= 1
+				hand[cmc_of_followup_spell - 1] -= 1
 				mana_available -= cmc_of_followup_spell
 				compounded_mana_spent += cmc_of_followup_spell
 				cumulative_mana_in_play += cmc_of_followup_spell
 				we_cast_a_nonrock_spell_this_turn = True
 		
-		if debug_mode:
+		if __debug__ and DEBUG:
 			print(f"After rocks, mana available {mana_available}. Cumulative mana {compounded_mana_spent}. Hand:", hand)
 		
-		if mana_available >= 3 and mana_available <= 6:
-			if hand[f'{mana_available} CMC'] == 0:
+		if 3 <= mana_available <= 6:
+			if hand[mana_available - 1] == 0:
 				#We have, for example, 5 mana but don't have a 5-drop in hand
 				#But let's check if we can cast a 2 and a 3 before checking for 4s
 				#Since mana_available - 2 could be 2, we also gotta check if the cards are distinct
-				if hand['2 CMC'] >= 1 and hand[f'{mana_available - 2} CMC'] >= 1 and hand['2 CMC'] + hand[f'{mana_available - 2} CMC'] >= 2:
-					hand['2 CMC'] -= 1
-					hand[f'{mana_available - 2} CMC'] -= 1
+				if hand[1] >= 1 and hand[mana_available - 3] >= 1 and (mana_available != 4 or hand[1] >= 2):
+					hand[1] -= 1
+					hand[mana_available - 3] -= 1
 					compounded_mana_spent += mana_available
 					cumulative_mana_in_play += mana_available
 					mana_available = 0
 					we_cast_a_nonrock_spell_this_turn = True
 		
-		Castable_cmc_6 = min(hand['6 CMC'], mana_available // 6)
-		hand['6 CMC'] -= Castable_cmc_6
-		mana_available -= Castable_cmc_6 * 6
-		#Six drops are very powerful and count as 6.2 mana each
-		compounded_mana_spent += Castable_cmc_6 * 6.2
-		cumulative_mana_in_play += Castable_cmc_6 * 6.2
-
-		Castable_cmc_5 = min(hand['5 CMC'], mana_available // 5)
-		hand['5 CMC'] -= Castable_cmc_5
-		mana_available -= Castable_cmc_5 * 5
-		compounded_mana_spent += Castable_cmc_5 * 5
-		cumulative_mana_in_play += Castable_cmc_5 * 5
-		
-		Castable_cmc_4 = min(hand['4 CMC'], mana_available // 4)
-		hand['4 CMC'] -= Castable_cmc_4
-		mana_available -= Castable_cmc_4 * 4
-		compounded_mana_spent += Castable_cmc_4 * 4
-		cumulative_mana_in_play += Castable_cmc_4 * 4
-
-		Castable_cmc_3 = min(hand['3 CMC'], mana_available // 3)
-		hand['3 CMC'] -= Castable_cmc_3
-		mana_available -= Castable_cmc_3 * 3
-		compounded_mana_spent += Castable_cmc_3 * 3
-		cumulative_mana_in_play += Castable_cmc_3 * 3
-		
-		Castable_cmc_2 = min(hand['2 CMC'], mana_available // 2)
-		hand['2 CMC'] -= Castable_cmc_2
-		mana_available -= Castable_cmc_2 * 2
-		compounded_mana_spent += Castable_cmc_2 * 2
-		cumulative_mana_in_play += Castable_cmc_2 * 2
-		
-		Castable_cmc_1 = min(hand['1 CMC'], mana_available // 1)
-		hand['1 CMC'] -= Castable_cmc_1
-		mana_available -= Castable_cmc_1 * 1
-		compounded_mana_spent += Castable_cmc_1 * 1
-		cumulative_mana_in_play += Castable_cmc_1 * 1
-
-		Castable_rock = min(hand['Rock'], mana_available // 2)
-		hand['Rock'] -= Castable_rock
+		#Cast spells from the most expensive on down; the mana weight of each drop is data rather than code
+		for cmc in range(6, 0, -1):
+			#Tapped out; the cheaper lanes can't cast anything either
+			if mana_available == 0:
+				break
+			Castable = min(hand[cmc - 1], mana_available // cmc)
+			if Castable >= 1:
+				hand[cmc - 1] -= Castable
+				mana_available -= Castable * cmc
+				#One weighted product feeds both tallies
+				mana_spent_on_lane = Castable * cmc_weight[cmc - 1]
+				compounded_mana_spent += mana_spent_on_lane
+				cumulative_mana_in_play += mana_spent_on_lane
+				we_cast_a_nonrock_spell_this_turn = True
+
+		Castable_rock = min(hand[ROCK], mana_available // 2)
+		hand[ROCK] -= Castable_rock
 		mana_available -= Castable_rock * 2
 		mana_available += Castable_rock
 		rocks_in_play += Castable_rock
 
-		if Castable_cmc_6 >= 1 or Castable_cmc_5 >= 1 or Castable_cmc_4 >= 1 or Castable_cmc_3 >= 1 or Castable_cmc_2 >= 1 or Castable_cmc_1 >= 1:
-			we_cast_a_nonrock_spell_this_turn = True
-
 		#If we retroactively notice we could've snuck in a mana rock, do so
-		if (mana_available_at_start_turn >= 2 and mana_available == 1) and hand['Rock'] >= 1 and we_cast_a_nonrock_spell_this_turn:
-			hand['Rock'] -= 1
+		if (mana_available_at_start_turn >= 2 and mana_available == 1) and hand[ROCK] >= 1 and we_cast_a_nonrock_spell_this_turn:
+			hand[ROCK] -= 1
 			rocks_in_play += 1
 			
 		#Finally, cast card draw spells
-		if draw_cost <= mana_available and hand['Draw'] >= 1:
-			hand['Draw'] -= 1
+		if draw_cost <= mana_available and hand[DRAW] >= 1:
+			hand[DRAW] -= 1
 			mana_available -= draw_cost
 			for _ in range (draw_draw):
-				card_drawn = library.pop(0)
-				hand[card_drawn] += 1
-			if not land_played and hand['Land'] >= 1:
-				hand['Land'] -= 1
+				position = randrange(cards_left)
+				cards_left -= 1
+				library[position], library[cards_left] = library[cards_left], library[position]
+				hand[library[cards_left]] += 1
+			if not land_played and hand[LAND] >= 1:
+				hand[LAND] -= 1
 				lands_in_play += 1
 				mana_available += 1
 				land_played = True
 		#I tried some code to cast spells after a card drawer, but it was all to no avail as card draw spells were never chosen by the optimizer regardless
 		#So I deleted that entire part of the code for now
 		
-		if debug_mode:
+		if __debug__ and DEBUG:
 			print(f"After spells, mana available {mana_available}. Cumulative mana {compounded_mana_spent}. Hand:", hand)
 
 	#Return lucky (True if you had Sol Ring on turn 1) to enable better rare event simulation with reduced variance, although that part was cut for time reasons
 	return (compounded_mana_spent, lucky)
 
 
-#Initialize local search algorithm
-num_simulations = 10000
-best_one = initial_1_cmc 
-best_two = initial_2_cmc 
-best_three = initial_3_cmc 
-best_four = initial_4_cmc 
-best_five = initial_5_cmc
-best_six = initial_6_cmc
-best_rock = initial_rock
-best_land = initial_land
-best_draw = initial_draw 
-previous_best_mana_spent = 0
-previous_sims_for_best_deck = 0
-sims_for_best_deck = 0
-continue_searching = True
-
-#We'll store and update the results for various decks in two dictionaries
-Estimation = {}
-Number_sims = {}
-
-#Start the local search
-#We start at a given initial feasible solution and we keep moving to better points in a neighborhood until no better point exists. 
-#Then we have reached a local optimum. We need a certain number of simulations before we can "safely" stop.
-#Neighborhood of a deck X, when the last nr sims for the best deck is < 150000: 
-	#all possible decks where the sum of the the absolute values of the difference with X is at most one.
-#Neighborhood of a deck X, when the last nr sims for the best deck is: 
-	#all possible 99-card decks where the for each card type, the absolute values of the difference with the number of copies of that card type in X is at most one.
-#We start with a limited number of simulations (num_simulations, 3000) as we explore and increase the number of simulations in every step
-#If we have to re-evaluate a deck, we combine the simulations from the current iterations with the ones that have already taken place prior.
-
-while continue_searching:
-	best_mana_spent = 0
-	improvement_possible = False
-	for one in range(max(best_one - 1, 0), best_one + 2):
-		for two in range(max(best_two - 1, 0), best_two + 2):
-			for three in range(max(best_three - 1, 0), best_three + 2):
-				for four in range(max(best_four - 1, 0), best_four + 2):
-					for five in range(max(best_five - 1, 0), best_five + 2):
-						for six in range(max(best_six - 1, 0), best_six + 2):
-							for rock in range(max(best_rock - 1, 0), best_rock + 2):
-								for draw in [0]: #This could vary initially, but was later fixed at 0 to greatly reduce optimization time
-									for land in range(max(best_land - 1, 0), best_land + 2):
-								
-										#We are now considering a new deck; is this actually in the neighborhood of the previous best deck?
-										nr_changes = abs(one - best_one) + abs(two - best_two) + abs(three - best_three) + abs(four - best_four)
-										nr_changes += abs(five - best_five) + abs(six - best_six) + abs(rock - best_rock) + abs(land - best_land)
-										if previous_sims_for_best_deck < 150000:
-											in_neighborhood = one + two + three + four + five + six + rock + draw + land == deck_size - 1 and nr_changes <= 2 
-										else:
-											in_neighborhood = one + two + three + four + five + six + rock + draw + land == deck_size - 1 
-										#Note that we check for deck_size -1 because Sol Ring is always part of the deck
-									
-										if in_neighborhood: 
-										
-											decklist = {
-												'1 CMC': one,
-												'2 CMC': two,
-												'3 CMC': three,
-												'4 CMC': four,
-												'5 CMC': five,
-												'6 CMC': six,
-												'Rock': rock,
-												'Sol Ring': 1,
-												'Draw': draw,
-												'Land': land
-											}
-											
-											if (one, two, three, four, five, six, rock, draw, land) not in Estimation.keys():
-												Estimation[one, two, three, four, five, six, rock, draw, land] = 0
-											if (one, two, three, four, five, six, rock, draw, land) not in Number_sims.keys():
-												Number_sims[one, two, three, four, five, six, rock, draw, land] = 0
-	
-											#If we know from previous iterations that this deck is performing not even close to the best deck, then don't waste more sims
-											dont_bother = False
-											if (Number_sims[ one, two, three, four, five, six, rock, draw, land] > 50000 and Estimation[ one, two, three, four, five, six, rock, draw, land] < 0.998 * previous_best_mana_spent):
-												dont_bother = True
-											if (Number_sims[ one, two, three, four, five, six, rock, draw, land] > 100000 and Estimation[ one, two, three, four, five, six, rock, draw, land] < 0.999 * previous_best_mana_spent):
-												dont_bother = True
-											if (Number_sims[ one, two, three, four, five, six, rock, draw, land] > 200000 and Estimation[ one, two, three, four, five, six, rock, draw, land] < 0.9995 * previous_best_mana_spent):
-												dont_bother = True
-												
-											if not dont_bother:
-												total_mana_spent = 0.0
-												for _ in range(num_simulations):
-													(mana_spent_in_sim, lucky) = run_one_sim()
-													#Lucky is true for Sol Ring on turn 1. This could be used for clever variance reduction techniques
-													#But this part was cut for time reasons
-													total_mana_spent += mana_spent_in_sim
-												average_mana_spent = round(total_mana_spent / num_simulations , 4)
-												#Add previous total sims to current number sims
-												previous_total_sims = Number_sims[ one, two, three, four, five, six, rock, draw, land]
-												Number_sims[ one, two, three, four, five, six, rock, draw, land] += num_simulations
-												#Take nr_sim-weighted combination of previous estimation and current estimation
-												previous_estimate = Estimation[ one, two, three, four, five, six, rock, draw, land]
-												Estimation[ one, two, three, four, five, six, rock, draw, land] = round((previous_estimate * previous_total_sims + average_mana_spent * num_simulations) / Number_sims[ one, two, three, four, five, six, rock, draw, land], 4)
-												
-												current_deck_is_same_as_previous_best = (one == best_one and two == best_two and three == best_three and four == best_four and five == best_five and six == best_six and rock == best_rock and draw == best_draw)
-												
-												#Are we doing better than the previuos best deck?
-												if Estimation[ one, two, three, four, five, six, rock, draw, land] >= best_mana_spent:
-													firstword = "Update!" if current_deck_is_same_as_previous_best else "Improv!" if Estimation[ one, two, three, four, five, six, rock, draw, land] >= previous_best_mana_spent else "-------"
-													print("---"+firstword+ "Deck "+ str(one) + ", " + str(two) + ", " + str(three) + ", " + str(four) + ", " + str(five) + ", " + str(six) + ", " + str(rock) + ", " + str(land) + " had " + str(previous_estimate) +"/"+ str(int(previous_total_sims))+", now "+str(Estimation[ one, two, three, four, five, six, rock, draw, land])+"/"+str(int(Number_sims[ one, two, three, four, five, six, rock, draw, land])))
-													best_mana_spent = Estimation[ one, two, three, four, five, six, rock, draw, land]
-													new_best_one = one
-													new_best_two = two
-													new_best_three = three
-													new_best_four = four
-													new_best_five = five
-													new_best_six = six
-													new_best_rock = rock
-													new_best_draw = draw
-													new_best_land = land
-													sims_for_best_deck = Number_sims[ one, two, three, four, five, six, rock, draw, land]
-												elif Estimation[ one, two, three, four, five, six, rock, draw, land] < previous_best_mana_spent and Estimation[ one, two, three, four, five, six, rock, draw, land] > 0.998 * best_mana_spent:
-													firstword = "Update!" if current_deck_is_same_as_previous_best else "Close! "
-													print("---"+firstword+"Deck "+ str(one) + ", " + str(two) + ", " + str(three) + ", " + str(four) + ", " + str(five) + ", " + str(six) + ", " + str(rock) + ", " + str(land) + " had " + str(previous_estimate) +"/"+ str(int(previous_total_sims))+", now "+str(Estimation[ one, two, three, four, five, six, rock, draw, land])+"/"+str(int(Number_sims[ one, two, three, four, five, six, rock, draw, land])))
-
-	previous_still_best = (new_best_one == best_one and new_best_two == best_two and new_best_three == best_three and new_best_four == best_four and new_best_five == best_five and new_best_six == best_six and new_best_rock == best_rock and new_best_draw == best_draw)
-	previous_best_mana_spent = best_mana_spent
-	if previous_still_best and sims_for_best_deck > 200000:
-		continue_searching = False
-	else:
-		continue_searching = True
+def simulate_deck_batch(args):
+	"""Run a batch of simulations for one decklist in a worker process, returning the deck key and the batch totals
+	Besides the mana totals this returns how often the sim was lucky (turn-1 Sol Ring) and the mana/lucky cross sum,
+	which the search needs for control-variate estimates
+	Sim k of an iteration is seeded identically for every deck (common random numbers), so nearby decks see the
+	same shuffles and the variance of their difference -- which is what the search actually compares -- shrinks"""
+	(deck_key, decklist, batch_size, base_seed, sim_offset) = args
+	rng = random.Random()
+	#The whole batch is the same deck, so build its library once; each sim starts from a copy of it
+	#Starting every sim from the same order also keeps the common-random-numbers coupling across decks exact
+	library_template = build_library(decklist)
+	total_mana_spent = 0.0
+	total_mana_spent_squared = 0.0
+	total_lucky = 0
+	total_mana_lucky = 0.0
+	for sim_index in range(batch_size):
+		rng.seed(base_seed + sim_offset + sim_index)
+		(mana_spent_in_sim, lucky) = run_one_sim(decklist, rng, library_template)
+		total_mana_spent += mana_spent_in_sim
+		total_mana_spent_squared += mana_spent_in_sim * mana_spent_in_sim
+		if lucky:
+			total_lucky += 1
+			total_mana_lucky += mana_spent_in_sim
+	return (deck_key, (total_mana_spent, total_mana_spent_squared, total_lucky, total_mana_lucky))
+
+@functools.lru_cache(maxsize=4096)
+def deck_desc(one, two, three, four, five, six, rock, land):
+	"""Short human-readable summary of a deck's counts for progress output; cached since the same few decks get reported over and over"""
+	return f"{one}, {two}, {three}, {four}, {five}, {six}, {rock}, {land}"
+
+
+def control_variate_estimate(deck_stats, pooled_lucky_rate):
+	"""
+	Parameters:
+		deck_stats - A deck's [estimate, nr_sims, sum_squares, sum_mana, sum_lucky, sum_mana_lucky] record
+		pooled_lucky_rate - Fraction of lucky sims pooled over every deck, standing in for the true turn-1 Sol Ring probability
+	Returns - The average mana spent, adjusted with the lucky indicator as a control variate
+	A deck whose sample happened to draw Sol Ring more often than expected gets adjusted down, and vice versa
+	Neighboring decks differ by one or two cards out of 99, so the pooled rate is a sound baseline for all of them
+	"""
+	nr_sims = deck_stats[1]
+	mean_mana = deck_stats[3] / nr_sims
+	mean_lucky = deck_stats[4] / nr_sims
+	variance_lucky = mean_lucky - mean_lucky * mean_lucky
+	if variance_lucky <= 0:
+		#Every sim (or no sim) was lucky; the control variate carries no information
+		return round(mean_mana, 4)
+	covariance = deck_stats[5] / nr_sims - mean_mana * mean_lucky
+	beta = covariance / variance_lucky
+	return round(mean_mana - beta * (mean_lucky - pooled_lucky_rate), 4)
+
+
+#The search only runs in the main process; worker processes import this module just for the functions above
+if __name__ == '__main__':
+	#Initialize local search algorithm
+	#One long-lived worker pool runs the simulations; every batch task carries its own explicit seeds,
+	#so workers never touch the module-level RNG and forked state sharing is a non-issue
+	nr_workers = multiprocessing.cpu_count()
+	pool = multiprocessing.Pool(processes=nr_workers)
+	num_simulations = 10000
+	#Non-best decks stop getting sims once they reach this many; past that point extra sims no longer change decisions
+	max_sims_per_deck = 250000
+	best_one = initial_1_cmc
+	best_two = initial_2_cmc 
+	best_three = initial_3_cmc 
+	best_four = initial_4_cmc 
+	best_five = initial_5_cmc
+	best_six = initial_6_cmc
+	best_rock = initial_rock
+	best_land = initial_land
+	best_draw = initial_draw 
+	previous_best_mana_spent = 0
+	previous_sims_for_best_deck = 0
+	sims_for_best_deck = 0
+	continue_searching = True
+	#Rolling window of the best estimate per iteration, for plateau detection
+	recent_best_estimates = deque(maxlen=32)
+
+	#We'll store and update the results for various decks in one contiguous numpy table, with a small dict mapping
+	#each packed deck key to its row; thousands of explored decks then share a few hundred KB that stays cache-resident,
+	#which also makes the override scan below operate on the table directly instead of rebuilding arrays every iteration
+	#Each row is [estimate, nr_sims, sum_squares, sum_mana, sum_lucky, sum_mana_lucky]
+	#sum_squares holds the running sum of squared deviations (Welford-style), which gives us a standard error per deck
+	#sum_lucky and sum_mana_lucky feed the control-variate estimate; the pooled counters track the lucky rate over all decks
+	deck_stats_capacity = 4096
+	deck_row = {}
+	deck_keys_table = np.zeros(deck_stats_capacity, dtype=np.int64)
+	deck_stats_table = np.zeros((deck_stats_capacity, 6))
+	nr_decks = 0
+	pooled_lucky = 0
+	pooled_sims = 0
+
+	#Results are persisted to disk after every iteration, so a rerun warm-starts from everything simulated before rather than re-exploring from scratch
+	#The cached estimates are only valid for the configuration they were simulated under, so a cache written for a
+	#different commander cost, deck size, or draw-spell parameters is discarded just like one with an old format
+	search_cache_file = 'optimal_curve_commander_cache.pkl'
+	cache_config = (deck_size, commander_cost, draw_cost, draw_draw)
+	try:
+		with open(search_cache_file, 'rb') as cache:
+			cached_search = pickle.load(cache)
+		if not isinstance(cached_search, dict) or cached_search.get('cache_version') != 3:
+			raise ValueError("stale cache format")
+		if cached_search.get('config') != cache_config:
+			raise ValueError("cache from a different configuration")
+		cached_keys = cached_search['deck_keys']
+		cached_stats = cached_search['deck_stats']
+		nr_decks = len(cached_keys)
+		while deck_stats_capacity < nr_decks:
+			deck_stats_capacity *= 2
+		deck_keys_table = np.zeros(deck_stats_capacity, dtype=np.int64)
+		deck_stats_table = np.zeros((deck_stats_capacity, 6))
+		deck_keys_table[:nr_decks] = cached_keys
+		deck_stats_table[:nr_decks] = cached_stats
+		deck_row = {int(deck_key): row for (row, deck_key) in enumerate(cached_keys)}
+		pooled_lucky = cached_search['pooled_lucky']
+		pooled_sims = cached_search['pooled_sims']
+		#Resume from the best-performing deck seen so far instead of the initial guess
+		best_row = int(np.argmax(deck_stats_table[:nr_decks, 0]))
+		(best_one, best_two, best_three, best_four, best_five, best_six, best_rock, best_draw, best_land) = unpack_deck_key(int(deck_keys_table[best_row]))
+		previous_best_mana_spent = deck_stats_table[best_row, 0]
+		sims_for_best_deck = int(deck_stats_table[best_row, 1])
+		previous_sims_for_best_deck = sims_for_best_deck
+		print(f"Loaded {nr_decks} previously explored decks from {search_cache_file}")
+	except (FileNotFoundError, ValueError, TypeError, KeyError, pickle.UnpicklingError, EOFError):
+		#These cover missing, corrupt, mismatched, and pre-current-format caches; just start fresh
+		pass
+
+	if simulated_annealing:
+		#Simulated annealing: evaluate ONE randomly chosen neighbor per step and accept it via the Metropolis criterion
+		#The search maximizes mana spent, so a worse deck is accepted with probability exp((new - old) / temperature)
+		#Early on the temperature is high and the walk roams; as it cools the walk settles into the best basin it found
+		#All statistics go into the same table as the local search, so switching modes between runs loses nothing
+		anneal_rng = random.Random()
+		cooling = 0.95
+		min_temperature = 1e-3
+		temperature = 0
+		current_deck = (best_one, best_two, best_three, best_four, best_five, best_six, best_rock, best_draw, best_land)
+		current_estimate = 0
+		anneal_best_estimate = 0
+		while continue_searching:
+			if temperature == 0:
+				#The first step evaluates the starting deck itself, to set the estimate scale before cooling begins
+				(one, two, three, four, five, six, rock, draw, land) = current_deck
+				candidate = current_deck
+				deck_key = pack_deck_key(*current_deck)
+				decklist = (one, two, three, four, five, six, rock, 1, draw, land)
+			else:
+				(candidate, deck_key, decklist) = anneal_rng.choice(nearby_decks(current_deck, False))
+				(one, two, three, four, five, six, rock, draw, land) = candidate
+
+			row = deck_row.get(deck_key)
+			if row is None:
+				if nr_decks == deck_stats_capacity:
+					deck_stats_capacity *= 2
+					grown_keys = np.zeros(deck_stats_capacity, dtype=np.int64)
+					grown_keys[:nr_decks] = deck_keys_table
+					deck_keys_table = grown_keys
+					grown_stats = np.zeros((deck_stats_capacity, 6))
+					grown_stats[:nr_decks] = deck_stats_table
+					deck_stats_table = grown_stats
+				row = nr_decks
+				nr_decks += 1
+				deck_row[deck_key] = row
+				deck_keys_table[row] = deck_key
+			deck_stats = deck_stats_table[row]
+
+			#Simulate this one deck across the whole pool
+			base_seed = random.getrandbits(62)
+			batch_size = num_simulations // (4 * nr_workers) + 1
+			tasks = []
+			sims_remaining = num_simulations
+			while sims_remaining > 0:
+				batch = min(batch_size, sims_remaining)
+				tasks.append((deck_key, decklist, batch, base_seed, num_simulations - sims_remaining))
+				sims_remaining -= batch
+			total_mana_spent = 0.0
+			total_mana_spent_squared = 0.0
+			total_lucky = 0
+			total_mana_lucky = 0.0
+			for (_, batch_result) in pool.imap_unordered(simulate_deck_batch, tasks):
+				total_mana_spent += batch_result[0]
+				total_mana_spent_squared += batch_result[1]
+				total_lucky += batch_result[2]
+				total_mana_lucky += batch_result[3]
+
+			#Fold the fresh sims into the deck's running record, exactly like the local search does
+			average_mana_spent = total_mana_spent / num_simulations
+			previous_total_sims = deck_stats[1]
+			previous_mean = deck_stats[3] / previous_total_sims if previous_total_sims > 0 else 0.0
+			deck_stats[1] += num_simulations
+			batch_sum_squares = total_mana_spent_squared - total_mana_spent * total_mana_spent / num_simulations
+			delta = average_mana_spent - previous_mean
+			deck_stats[2] += batch_sum_squares + delta * delta * previous_total_sims * num_simulations / deck_stats[1]
+			deck_stats[3] += total_mana_spent
+			deck_stats[4] += total_lucky
+			deck_stats[5] += total_mana_lucky
+			pooled_lucky += total_lucky
+			pooled_sims += num_simulations
+			deck_stats[0] = control_variate_estimate(deck_stats, pooled_lucky / pooled_sims)
+			estimate = deck_stats[0]
+
+			if temperature == 0:
+				#Seed the walk and the cooling schedule from the first evaluation
+				current_estimate = estimate
+				anneal_best_estimate = estimate
+				temperature = 0.1 * estimate
+			else:
+				if estimate >= current_estimate or anneal_rng.random() < math.exp((estimate - current_estimate) / temperature):
+					current_deck = candidate
+					current_estimate = estimate
+					print("---Accept!Deck " + deck_desc(one, two, three, four, five, six, rock, land) + " at " + str(estimate) + "/" + str(int(deck_stats[1])) + ", temperature " + str(round(temperature, 4)))
+				#Track the best deck ever visited separately; the walk itself may wander off it
+				if estimate > anneal_best_estimate:
+					anneal_best_estimate = estimate
+					(best_one, best_two, best_three, best_four, best_five, best_six, best_rock, best_draw, best_land) = candidate
+				temperature *= cooling
+				if temperature < min_temperature:
+					continue_searching = False
+
+			#Persist progress every step, same file and format as the local search
+			with open(search_cache_file + '.tmp', 'wb') as cache:
+				pickle.dump({'cache_version': 3, 'config': cache_config, 'deck_keys': deck_keys_table[:nr_decks].copy(), 'deck_stats': deck_stats_table[:nr_decks].copy(), 'pooled_lucky': pooled_lucky, 'pooled_sims': pooled_sims}, cache)
+			os.replace(search_cache_file + '.tmp', search_cache_file)
+
+		print("====>Deck: " + str(best_one) + " one-drops, " + str(best_two) + " two, " + str(best_three) + " three, " + str(best_four) + " four, " + str(best_five) + " five, " + str(best_six) + " six, " + str(best_rock) + " Signet, 1 Sol Ring, " + str(best_land) + " lands ==> " + str(anneal_best_estimate) + ".")
+
+	#Start the local search
+	#We start at a given initial feasible solution and we keep moving to better points in a neighborhood until no better point exists. 
+	#Then we have reached a local optimum. We need a certain number of simulations before we can "safely" stop.
+	#Neighborhood of a deck X, when the last nr sims for the best deck is < 150000: 
+		#all possible decks where the sum of the the absolute values of the difference with X is at most one.
+	#Neighborhood of a deck X, when the last nr sims for the best deck is: 
+		#all possible 99-card decks where the for each card type, the absolute values of the difference with the number of copies of that card type in X is at most one.
+	#We start with a limited number of simulations (num_simulations, 3000) as we explore and increase the number of simulations in every step
+	#If we have to re-evaluate a deck, we combine the simulations from the current iterations with the ones that have already taken place prior.
+
+	while continue_searching:
+		best_mana_spent = 0
+		improvement_possible = False
+		#When the best deck is well-established, widen the neighborhood to every deck within one copy per card type
+		wide_neighborhood = previous_sims_for_best_deck >= 150000
+		#The prune target never changes within an iteration, so fix it here once
+		prune_cutoff = previous_best_mana_spent
+		center_deck_key = pack_deck_key(best_one, best_two, best_three, best_four, best_five, best_six, best_rock, best_draw, best_land)
+		candidates = nearby_decks((best_one, best_two, best_three, best_four, best_five, best_six, best_rock, best_draw, best_land), wide_neighborhood)
+
+		#First pass: decide which candidate decks get simulations this iteration
+		#The prune decision only depends on statistics from previous iterations, so it can happen before any sim runs
+		decks_to_simulate = []
+		for ((one, two, three, four, five, six, rock, draw, land), deck_key, decklist) in candidates:
+
+			#One dict lookup fetches this deck's row; the row view is mutable, so updates write straight into the table
+			row = deck_row.get(deck_key)
+			if row is None:
+				if nr_decks == deck_stats_capacity:
+					#Grow the table by doubling; amortized this costs nothing and rows never move
+					deck_stats_capacity *= 2
+					grown_keys = np.zeros(deck_stats_capacity, dtype=np.int64)
+					grown_keys[:nr_decks] = deck_keys_table
+					deck_keys_table = grown_keys
+					grown_stats = np.zeros((deck_stats_capacity, 6))
+					grown_stats[:nr_decks] = deck_stats_table
+					deck_stats_table = grown_stats
+				row = nr_decks
+				nr_decks += 1
+				deck_row[deck_key] = row
+				deck_keys_table[row] = deck_key
+			deck_stats = deck_stats_table[row]
+
+			#If the 95% confidence interval for this deck already lies below the prune cutoff, then don't waste more sims
+			#With few sims the interval is wide, so nothing gets pruned prematurely
+			#Comparing squared margins avoids a sqrt per candidate: margin > 2 * stderr <=> margin^2 > 4 * stderr^2
+			dont_bother = False
+			if deck_stats[1] >= 2 and prune_cutoff > 0:
+				margin = prune_cutoff - deck_stats[0]
+				if margin > 0 and margin * margin > 4 * deck_stats[2] / ((deck_stats[1] - 1) * deck_stats[1]):
+					dont_bother = True
+
+			#A saturated estimator won't change any decision; only the current best deck may keep accumulating sims
+			#The cap sits above the stopping threshold, so the champion can still reach the sims it needs to end the search
+			if deck_stats[1] >= max_sims_per_deck and deck_key != center_deck_key:
+				dont_bother = True
+
+			if not dont_bother:
+				decks_to_simulate.append((deck_key, decklist))
+
+		#Second pass: one pool dispatch covers every deck in the neighborhood, so the workers stay saturated
+		#across deck boundaries instead of draining and refilling once per deck
+		#Batches are sized to give each worker several tasks even when only a single deck needs sims
+		#Workers only ever return batch sums; all running statistics live in this process, so combining a deck's
+		#fresh sims with its prior sims needs no shared dict and no lock, just the merge below as results stream in
+		deck_batch_totals = {}
+		if decks_to_simulate:
+			batch_size = max(1, min(num_simulations, (num_simulations * len(decks_to_simulate)) // (8 * nr_workers) + 1))
+			#Common random numbers: sim k gets the same seed for every deck this iteration, so nearby decks face
+			#identical shuffles and their estimates move together; the base seed is fresh per iteration, so a deck
+			#re-simulated next iteration still accumulates independent samples
+			base_seed = random.getrandbits(62)
+			tasks = []
+			for (deck_key, decklist) in decks_to_simulate:
+				sims_remaining = num_simulations
+				while sims_remaining > 0:
+					batch = min(batch_size, sims_remaining)
+					tasks.append((deck_key, decklist, batch, base_seed, num_simulations - sims_remaining))
+					sims_remaining -= batch
+			for (deck_key, batch_result) in pool.imap_unordered(simulate_deck_batch, tasks):
+				deck_totals = deck_batch_totals.setdefault(deck_key, [0.0, 0.0, 0, 0.0])
+				deck_totals[0] += batch_result[0]
+				deck_totals[1] += batch_result[1]
+				deck_totals[2] += batch_result[2]
+				deck_totals[3] += batch_result[3]
+
+		#Third pass: fold the fresh results into each deck's record and pick the best of the neighborhood
+		for ((one, two, three, four, five, six, rock, draw, land), deck_key, decklist) in candidates:
+			deck_totals = deck_batch_totals.get(deck_key)
+			if deck_totals is not None:
+				deck_stats = deck_stats_table[deck_row[deck_key]]
+				(total_mana_spent, total_mana_spent_squared, total_lucky, total_mana_lucky) = deck_totals
+				average_mana_spent = total_mana_spent / num_simulations
+				#Fold this batch into the running sum of squared deviations (Chan et al. parallel variance update)
+				previous_total_sims = deck_stats[1]
+				previous_mean = deck_stats[3] / previous_total_sims if previous_total_sims > 0 else 0.0
+				deck_stats[1] += num_simulations
+				batch_sum_squares = total_mana_spent_squared - total_mana_spent * total_mana_spent / num_simulations
+				delta = average_mana_spent - previous_mean
+				deck_stats[2] += batch_sum_squares + delta * delta * previous_total_sims * num_simulations / deck_stats[1]
+				#Accumulate the control-variate sufficient statistics, for this deck and pooled over all decks
+				deck_stats[3] += total_mana_spent
+				deck_stats[4] += total_lucky
+				deck_stats[5] += total_mana_lucky
+				pooled_lucky += total_lucky
+				pooled_sims += num_simulations
+				#Estimate the deck's average mana spent, corrected for how lucky its sample happened to be
+				previous_estimate = deck_stats[0]
+				deck_stats[0] = control_variate_estimate(deck_stats, pooled_lucky / pooled_sims)
+
+				#The packed key comparison replaces an eight-field tuple comparison per reported deck
+				current_deck_is_same_as_previous_best = (deck_key == center_deck_key)
+
+				#Are we doing better than the previuos best deck?
+				if deck_stats[0] >= best_mana_spent:
+					firstword = "Update!" if current_deck_is_same_as_previous_best else "Improv!" if deck_stats[0] >= previous_best_mana_spent else "-------"
+					print("---"+firstword+ "Deck "+ deck_desc(one, two, three, four, five, six, rock, land) + " had " + str(previous_estimate) +"/"+ str(int(previous_total_sims))+", now "+str(deck_stats[0])+"/"+str(int(deck_stats[1])))
+					best_mana_spent = deck_stats[0]
+					new_best_one = one
+					new_best_two = two
+					new_best_three = three
+					new_best_four = four
+					new_best_five = five
+					new_best_six = six
+					new_best_rock = rock
+					new_best_draw = draw
+					new_best_land = land
+					sims_for_best_deck = int(deck_stats[1])
+				elif deck_stats[0] < previous_best_mana_spent and deck_stats[0] > 0.998 * best_mana_spent:
+					firstword = "Update!" if current_deck_is_same_as_previous_best else "Close! "
+					print("---"+firstword+"Deck "+ deck_desc(one, two, three, four, five, six, rock, land) + " had " + str(previous_estimate) +"/"+ str(int(previous_total_sims))+", now "+str(deck_stats[0])+"/"+str(int(deck_stats[1])))
+
+		previous_still_best = (pack_deck_key(new_best_one, new_best_two, new_best_three, new_best_four, new_best_five, new_best_six, new_best_rock, new_best_draw, new_best_land) == center_deck_key)
+		previous_best_mana_spent = best_mana_spent
+		if previous_still_best and sims_for_best_deck > 200000:
+			continue_searching = False
+		else:
+			continue_searching = True
+
+		#Early stopping: once the window is full, compare the recent half against the whole window
+		#If the last 16 iterations haven't beaten the 32-iteration average, the local optimum has plateaued and more sims won't move it
+		recent_best_estimates.append(best_mana_spent)
+		if plateau_early_stopping and len(recent_best_estimates) == 32:
+			recent_half_average = sum(list(recent_best_estimates)[16:]) / 16
+			full_window_average = sum(recent_best_estimates) / 32
+			if recent_half_average <= full_window_average:
+				print("Stopping early: the best estimate has plateaued over the last 32 iterations")
+				continue_searching = False
 		
-	#Move to the best option we've seen in the immediate neighborhood
-	best_one = new_best_one
-	best_two = new_best_two
-	best_three = new_best_three
-	best_four = new_best_four
-	best_five = new_best_five
-	best_six = new_best_six
-	best_rock = new_best_rock
-	best_draw = new_best_draw
-	best_land = new_best_land
+		#Move to the best option we've seen in the immediate neighborhood
+		best_one = new_best_one
+		best_two = new_best_two
+		best_three = new_best_three
+		best_four = new_best_four
+		best_five = new_best_five
+		best_six = new_best_six
+		best_rock = new_best_rock
+		best_draw = new_best_draw
+		best_land = new_best_land
 	
-	#However, check if we've seen a better option with reasonable sample size in previous iterations; if so, override
-	for (one, two, three, four, five, six, rock, draw, land) in Estimation.keys():
-		if Estimation[ one, two, three, four, five, six, rock, draw, land] >= best_mana_spent and Number_sims[ one, two, three, four, five, six, rock, draw, land] >= previous_sims_for_best_deck / 2:
-			best_mana_spent = Estimation[ one, two, three, four, five, six, rock, draw, land]
-			best_one = one
-			best_two = two
-			best_three = three
-			best_four = four
-			best_five = five
-			best_six = six
-			best_rock = rock
-			best_draw = draw
-			best_land = land
-			sims_for_best_deck = Number_sims[ one, two, three, four, five, six, rock, draw, land]
-
-	num_simulations += 1000
-	previous_sims_for_best_deck = sims_for_best_deck
-	print("====>Deck: " + str(best_one) + " one-drops, " + str(best_two) + " two, " + str(best_three) + " three, " + str(best_four) + " four, " + str(best_five) + " five, " + str(best_six) + " six, " + str(best_rock) + " Signet, 1 Sol Ring, " + str(best_land) + " lands ==> "+str(best_mana_spent)+".")
\ No newline at end of file
+		#Refresh every explored deck's estimate against the current pooled lucky rate, so all comparisons below share one baseline
+		#Vectorized over the whole stats table; calling the scalar estimator per deck grew linearly with the explored set
+		pooled_lucky_rate = pooled_lucky / pooled_sims
+		stats = deck_stats_table[:nr_decks]
+		nr_sims_column = stats[:, 1]
+		simulated = nr_sims_column > 0
+		with np.errstate(divide='ignore', invalid='ignore'):
+			mean_mana = stats[:, 3] / nr_sims_column
+			mean_lucky = stats[:, 4] / nr_sims_column
+			variance_lucky = mean_lucky - mean_lucky * mean_lucky
+			beta = (stats[:, 5] / nr_sims_column - mean_mana * mean_lucky) / variance_lucky
+			adjusted = mean_mana - beta * (mean_lucky - pooled_lucky_rate)
+		#Decks whose sample was all lucky or all unlucky carry no control-variate information; keep their plain mean
+		adjusted = np.where(variance_lucky > 0, adjusted, mean_mana)
+		stats[:, 0] = np.where(simulated, np.round(adjusted, 4), stats[:, 0])
+
+		#However, check if we've seen a better option with reasonable sample size in previous iterations; if so, override
+		#The stats already live in one contiguous table, so this scan runs vectorized with no per-iteration conversion
+		estimates = deck_stats_table[:nr_decks, 0]
+		sim_counts = deck_stats_table[:nr_decks, 1]
+		eligible = (estimates >= best_mana_spent) & (sim_counts >= previous_sims_for_best_deck / 2)
+		if eligible.any():
+			winner = int(np.argmax(np.where(eligible, estimates, -np.inf)))
+			best_mana_spent = float(estimates[winner])
+			#Only the single winning key ever gets unpacked back into card counts
+			(best_one, best_two, best_three, best_four, best_five, best_six, best_rock, best_draw, best_land) = unpack_deck_key(int(deck_keys_table[winner]))
+			sims_for_best_deck = int(sim_counts[winner])
+
+		#Save everything we've learned so far, so an interrupted or repeated run doesn't have to redo these simulations
+		#Write to a temp file and swap it in, so a kill mid-write can't corrupt the cache
+		with open(search_cache_file + '.tmp', 'wb') as cache:
+			pickle.dump({'cache_version': 3, 'config': cache_config, 'deck_keys': deck_keys_table[:nr_decks].copy(), 'deck_stats': deck_stats_table[:nr_decks].copy(), 'pooled_lucky': pooled_lucky, 'pooled_sims': pooled_sims}, cache)
+		os.replace(search_cache_file + '.tmp', search_cache_file)
+
+		num_simulations += 1000
+		previous_sims_for_best_deck = sims_for_best_deck
+		print("====>Deck: " + str(best_one) + " one-drops, " + str(best_two) + " two, " + str(best_three) + " three, " + str(best_four) + " four, " + str(best_five) + " five, " + str(best_six) + " six, " + str(best_rock) + " Signet, 1 Sol Ring, " + str(best_land) + " lands ==> "+str(best_mana_spent)+".")
\ No newline at end of file